@@ -0,0 +1,20 @@
+"""
+Shared pytest fixtures.
+"""
+
+import pytest
+
+from src import database
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Run the database against an empty data directory with a cold cache."""
+    monkeypatch.chdir(tmp_path)
+    for name in ("_clients_cache", "_clients_mtime", "_clients_timer",
+                 "_invoices_cache", "_invoices_mtime", "_invoices_timer"):
+        monkeypatch.setattr(database, name, None)
+    monkeypatch.setattr(database, "_clients_dirty", False)
+    monkeypatch.setattr(database, "_invoices_dirty", False)
+    yield database
+    database.sync_now()
@@ -1,7 +1,31 @@
 # Invoice-Manager/main.py
 import os
+import signal
+from starlette.middleware import Middleware
+from starlette.middleware.gzip import GZipMiddleware
+from src.database import sync_now
 from src.server import mcp
 
+
+def handle_sigterm(signum, frame):
+    """Flush pending database writes, then terminate as SIGTERM normally would."""
+    sync_now()
+    signal.signal(signum, signal.SIG_DFL)
+    signal.raise_signal(signum)
+
+
 if __name__ == "__main__":
+    # uvicorn re-raises SIGTERM after its graceful shutdown, which would kill
+    # the process before atexit handlers run and lose debounced writes.
+    signal.signal(signal.SIGTERM, handle_sigterm)
     port = int(os.environ.get("PORT", "8000"))
-    mcp.run(transport="streamable-http", host="0.0.0.0", port=port)
+    mcp.run(
+        transport="streamable-http",
+        host="0.0.0.0",
+        port=port,
+        # Plain JSON responses instead of SSE streams, so GZipMiddleware
+        # (which skips text/event-stream) can compress them.
+        json_response=True,
+        middleware=[Middleware(GZipMiddleware, minimum_size=1024)],
+        uvicorn_config={"backlog": 2048, "timeout_keep_alive": 30}
+    )
@@ -2,12 +2,17 @@
 JSON file-based database for clients and invoices.
 """
 
-import json
+import atexit
 import logging
+import math
+import os
+import threading
 from datetime import datetime
 from typing import Optional
 from pathlib import Path
 
+import orjson
+
 
 DATA_DIR = Path("data")
 CLIENTS_FILE = DATA_DIR / "clients.json"
@@ -15,6 +20,58 @@ INVOICES_FILE = DATA_DIR / "invoices.json"
 
 logger = logging.getLogger(__name__)
 
+# Parsed file contents are cached in memory and only re-read from disk when
+# the file's mtime changes. FastMCP serves requests concurrently, so every
+# access to the cache goes through _lock. The *_by_id dicts index the cached
+# records by ID, and invoices are additionally indexed by client ID and by
+# status; all indexes must be kept in sync with the cached lists. The revenue
+# of paid invoices is summed from the "paid" bucket on demand and cached until
+# that bucket changes.
+# Clients also get a search index of ClientRow entries holding their lowercased
+# name, email and company, so case-insensitive searches need no per-query
+# lowercasing.
+#
+# Writes are debounced: saving only updates the cache and (re)starts a timer,
+# so a burst of mutations results in a single flush to disk FLUSH_DELAY
+# seconds after the last one. While a collection is dirty the cache is
+# authoritative and the file on disk is not consulted. A flush serializes the
+# data under _lock but writes and fsyncs the file under _write_lock only, so
+# reads are not blocked by disk I/O. The *_version counters tell a finished
+# flush whether the cache changed again while it was writing. Lock order is
+# _write_lock before _lock.
+FLUSH_DELAY = 0.5
+WRITE_BUFFER_SIZE = 64 * 1024
+
+_lock = threading.RLock()
+_write_lock = threading.Lock()
+_clients_cache: Optional[dict] = None
+_clients_mtime: Optional[int] = None
+_clients_by_id: dict[int, dict] = {}
+_clients_search_index: list["ClientRow"] = []
+_clients_dirty = False
+_clients_timer: Optional[threading.Timer] = None
+_clients_version = 0
+_invoices_cache: Optional[dict] = None
+_invoices_mtime: Optional[int] = None
+_invoices_by_id: dict[int, dict] = {}
+_invoices_by_client: dict[int, list[dict]] = {}
+_invoices_by_status: dict[str, dict[int, dict]] = {}
+_paid_revenue: Optional[float] = None
+_invoices_dirty = False
+_invoices_timer: Optional[threading.Timer] = None
+_invoices_version = 0
+
+
+class ClientRow:
+    """Search index entry for a client, with its text fields lowercased."""
+    __slots__ = ("name_lc", "email_lc", "company_lc", "record")
+
+    def __init__(self, client: dict):
+        self.name_lc = (client.get("name") or "").lower()
+        self.email_lc = (client.get("email") or "").lower()
+        self.company_lc = (client.get("company") or "").lower()
+        self.record = client
+
 
 def ensure_data_dir():
     """Ensure the data directory exists."""
@@ -31,26 +88,129 @@ def _get_default_invoices() -> dict:
     return {"invoices": [], "next_id": 1}
 
 
+def _get_mtime(path: Path) -> Optional[int]:
+    """Return the file's mtime in nanoseconds, or None if it does not exist."""
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _write_bytes(path: Path, payload: bytes):
+    """
+    Atomically write serialized JSON to path.
+
+    The payload is written and fsynced to a temporary file which then replaces
+    the target, and the directory is fsynced so the rename itself is durable.
+    A crash mid-write therefore never leaves a truncated JSON file behind.
+    """
+    ensure_data_dir()
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "wb", buffering=WRITE_BUFFER_SIZE) as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    dir_fd = os.open(path.parent, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def _set_clients_cache(data: dict, mtime: Optional[int]):
+    """Replace the cached clients data and rebuild its indexes."""
+    global _clients_cache, _clients_mtime, _clients_by_id
+    _clients_cache = data
+    _clients_mtime = mtime
+    _clients_by_id = {c.get("id"): c for c in data["clients"]}
+    _clients_search_index.clear()
+    for client in data["clients"]:
+        _index_client(client)
+
+
+def _index_client(client: dict):
+    """Add a client to the search index."""
+    _clients_search_index.append(ClientRow(client))
+
+
+def _set_invoices_cache(data: dict, mtime: Optional[int]):
+    """Replace the cached invoices data and rebuild its indexes."""
+    global _invoices_cache, _invoices_mtime, _invoices_by_id, _paid_revenue
+    _invoices_cache = data
+    _invoices_mtime = mtime
+    _paid_revenue = None
+    _invoices_by_id = {inv.get("id"): inv for inv in data["invoices"]}
+    _invoices_by_client.clear()
+    _invoices_by_status.clear()
+    for invoice in data["invoices"]:
+        _index_invoice(invoice)
+
+
+def _index_invoice(invoice: dict):
+    """Add an invoice to the client and status indexes."""
+    _invoices_by_client.setdefault(invoice.get("client_id"), []).append(invoice)
+    _add_to_status_index(invoice)
+
+
+def _add_to_status_index(invoice: dict):
+    """Add an invoice to the status index."""
+    global _paid_revenue
+    status = invoice.get("status", "").lower()
+    _invoices_by_status.setdefault(status, {})[invoice.get("id")] = invoice
+    if status == "paid":
+        _paid_revenue = None
+
+
+def _remove_from_status_index(invoice: dict):
+    """Remove an invoice from the status index."""
+    global _paid_revenue
+    status = invoice.get("status", "").lower()
+    _invoices_by_status.get(status, {}).pop(invoice.get("id"), None)
+    if status == "paid":
+        _paid_revenue = None
+
+
+def _start_timer(timer: Optional[threading.Timer], flush) -> threading.Timer:
+    """Cancel a pending flush timer and start a new one."""
+    if timer is not None:
+        timer.cancel()
+    timer = threading.Timer(FLUSH_DELAY, flush)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+
 def load_clients() -> dict:
-    """Load clients from JSON file with error recovery."""
+    """Load clients, re-reading the JSON file only if it changed on disk."""
+    with _lock:
+        if _clients_dirty:
+            return _clients_cache
+        mtime = _get_mtime(CLIENTS_FILE)
+        if _clients_cache is None or mtime != _clients_mtime:
+            _set_clients_cache(_read_clients(), mtime)
+        return _clients_cache
+
+
+def _read_clients() -> dict:
+    """Read clients from JSON file with error recovery."""
     ensure_data_dir()
-    if not CLIENTS_FILE.exists():
-        return _get_default_clients()
     try:
-        with open(CLIENTS_FILE, "r") as f:
-            data = json.load(f)
-            if not isinstance(data, dict):
-                logger.warning("Invalid clients data structure, resetting to defaults")
-                return _get_default_clients()
-            if "clients" not in data or not isinstance(data.get("clients"), list):
-                logger.warning("Missing or invalid clients list, resetting to defaults")
-                return _get_default_clients()
-            if "next_id" not in data or not isinstance(data.get("next_id"), int):
-                logger.warning("Missing or invalid next_id, recalculating")
-                max_id = max((c.get("id", 0) for c in data["clients"]), default=0)
-                data["next_id"] = max_id + 1
-            return data
-    except json.JSONDecodeError as e:
+        data = orjson.loads(CLIENTS_FILE.read_bytes())
+        if not isinstance(data, dict):
+            logger.warning("Invalid clients data structure, resetting to defaults")
+            return _get_default_clients()
+        if "clients" not in data or not isinstance(data.get("clients"), list):
+            logger.warning("Missing or invalid clients list, resetting to defaults")
+            return _get_default_clients()
+        if "next_id" not in data or not isinstance(data.get("next_id"), int):
+            logger.warning("Missing or invalid next_id, recalculating")
+            max_id = max((c.get("id", 0) for c in data["clients"]), default=0)
+            data["next_id"] = max_id + 1
+        return data
+    except FileNotFoundError:
+        return _get_default_clients()
+    except orjson.JSONDecodeError as e:
         logger.error(f"Failed to parse clients.json: {e}. Resetting to defaults.")
         return _get_default_clients()
     except Exception as e:
@@ -59,32 +219,77 @@ def load_clients() -> dict:
 
 
 def save_clients(data: dict):
-    """Save clients to JSON file."""
-    ensure_data_dir()
-    with open(CLIENTS_FILE, "w") as f:
-        json.dump(data, f, indent=2, default=str)
+    """Replace the cached clients and schedule a write to the JSON file."""
+    with _lock:
+        _set_clients_cache(data, _clients_mtime)
+        _mark_clients_dirty()
+
+
+def _mark_clients_dirty():
+    """Schedule a debounced flush of the cached clients."""
+    global _clients_dirty, _clients_timer, _clients_version
+    _clients_dirty = True
+    _clients_version += 1
+    _clients_timer = _start_timer(_clients_timer, _flush_clients)
+
+
+def _flush_clients():
+    """Write the cached clients to disk if they have unsaved changes."""
+    global _clients_dirty, _clients_timer, _clients_mtime
+    with _write_lock:
+        with _lock:
+            if not _clients_dirty:
+                return
+            payload = orjson.dumps(_clients_cache, option=orjson.OPT_INDENT_2)
+            version = _clients_version
+            _clients_timer = None
+        try:
+            _write_bytes(CLIENTS_FILE, payload)
+        except Exception as e:
+            logger.error(f"Failed to write clients.json: {e}. Retrying.")
+            with _lock:
+                _clients_timer = _start_timer(_clients_timer, _flush_clients)
+            return
+        with _lock:
+            _clients_mtime = _get_mtime(CLIENTS_FILE)
+            if _clients_version == version:
+                _clients_dirty = False
 
 
 def load_invoices() -> dict:
-    """Load invoices from JSON file with error recovery."""
+    """Load invoices, re-reading the JSON file only if it changed on disk."""
+    with _lock:
+        if _invoices_dirty:
+            return _invoices_cache
+        mtime = _get_mtime(INVOICES_FILE)
+        if _invoices_cache is None or mtime != _invoices_mtime:
+            _set_invoices_cache(_read_invoices(), mtime)
+        return _invoices_cache
+
+
+def _read_invoices() -> dict:
+    """Read invoices from JSON file with error recovery."""
     ensure_data_dir()
-    if not INVOICES_FILE.exists():
-        return _get_default_invoices()
     try:
-        with open(INVOICES_FILE, "r") as f:
-            data = json.load(f)
-            if not isinstance(data, dict):
-                logger.warning("Invalid invoices data structure, resetting to defaults")
-                return _get_default_invoices()
-            if "invoices" not in data or not isinstance(data.get("invoices"), list):
-                logger.warning("Missing or invalid invoices list, resetting to defaults")
-                return _get_default_invoices()
-            if "next_id" not in data or not isinstance(data.get("next_id"), int):
-                logger.warning("Missing or invalid next_id, recalculating")
-                max_id = max((inv.get("id", 0) for inv in data["invoices"]), default=0)
-                data["next_id"] = max_id + 1
-            return data
-    except json.JSONDecodeError as e:
+        data = orjson.loads(INVOICES_FILE.read_bytes())
+        if not isinstance(data, dict):
+            logger.warning("Invalid invoices data structure, resetting to defaults")
+            return _get_default_invoices()
+        if "invoices" not in data or not isinstance(data.get("invoices"), list):
+            logger.warning("Missing or invalid invoices list, resetting to defaults")
+            return _get_default_invoices()
+        if "next_id" not in data or not isinstance(data.get("next_id"), int):
+            logger.warning("Missing or invalid next_id, recalculating")
+            max_id = max((inv.get("id", 0) for inv in data["invoices"]), default=0)
+            data["next_id"] = max_id + 1
+        for invoice in data["invoices"]:
+            if not _is_finite_number(invoice.get("total", 0)):
+                logger.warning(f"Invalid total on invoice {invoice.get('id')}, recalculating from items")
+                invoice["total"] = _recalculate_total(invoice)
+        return data
+    except FileNotFoundError:
+        return _get_default_invoices()
+    except orjson.JSONDecodeError as e:
         logger.error(f"Failed to parse invoices.json: {e}. Resetting to defaults.")
         return _get_default_invoices()
     except Exception as e:
@@ -92,26 +297,194 @@ def load_invoices() -> dict:
         return _get_default_invoices()
 
 
+def _is_finite_number(value) -> bool:
+    """Check whether a value is a finite int or float (but not a bool)."""
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def _recalculate_total(invoice: dict) -> float:
+    """Sum an invoice's line items, falling back to 0.0 if they are unusable."""
+    try:
+        total = math.fsum(
+            float(item["quantity"]) * float(item["unit_price"])
+            for item in invoice.get("items", [])
+        )
+    except (KeyError, TypeError, ValueError, OverflowError):
+        return 0.0
+    return total if math.isfinite(total) else 0.0
+
+
+def _check_total(invoice: dict):
+    """
+    Reject invoices whose total cannot be stored.
+
+    orjson writes non-finite floats as null, which would break every later
+    read of the file, so such totals must never reach the cache.
+    """
+    total = invoice.get("total", 0)
+    if not _is_finite_number(total):
+        raise ValueError(f"Invoice total must be a finite number, got {total!r}")
+
+
 def save_invoices(data: dict):
-    """Save invoices to JSON file."""
-    ensure_data_dir()
-    with open(INVOICES_FILE, "w") as f:
-        json.dump(data, f, indent=2, default=str)
+    """Replace the cached invoices and schedule a write to the JSON file."""
+    for invoice in data["invoices"]:
+        _check_total(invoice)
+    with _lock:
+        _set_invoices_cache(data, _invoices_mtime)
+        _mark_invoices_dirty()
+
+
+def _mark_invoices_dirty():
+    """Schedule a debounced flush of the cached invoices."""
+    global _invoices_dirty, _invoices_timer, _invoices_version
+    _invoices_dirty = True
+    _invoices_version += 1
+    _invoices_timer = _start_timer(_invoices_timer, _flush_invoices)
+
+
+def _flush_invoices():
+    """Write the cached invoices to disk if they have unsaved changes."""
+    global _invoices_dirty, _invoices_timer, _invoices_mtime
+    with _write_lock:
+        with _lock:
+            if not _invoices_dirty:
+                return
+            payload = orjson.dumps(_invoices_cache, option=orjson.OPT_INDENT_2)
+            version = _invoices_version
+            _invoices_timer = None
+        try:
+            _write_bytes(INVOICES_FILE, payload)
+        except Exception as e:
+            logger.error(f"Failed to write invoices.json: {e}. Retrying.")
+            with _lock:
+                _invoices_timer = _start_timer(_invoices_timer, _flush_invoices)
+            return
+        with _lock:
+            _invoices_mtime = _get_mtime(INVOICES_FILE)
+            if _invoices_version == version:
+                _invoices_dirty = False
+
+
+def sync_now():
+    """Flush any pending writes to disk immediately."""
+    with _lock:
+        for timer in (_clients_timer, _invoices_timer):
+            if timer is not None:
+                timer.cancel()
+    _flush_clients()
+    _flush_invoices()
+
+
+atexit.register(sync_now)
+
+
+def insert_client(client: dict) -> dict:
+    """Assign the next client ID, store the client and return it."""
+    with _lock:
+        data = load_clients()
+        client["id"] = data["next_id"]
+        data["clients"].append(client)
+        data["next_id"] += 1
+        _clients_by_id[client["id"]] = client
+        _index_client(client)
+        _mark_clients_dirty()
+        return client
+
+
+def insert_invoice(invoice: dict) -> dict:
+    """Assign the next invoice ID, store the invoice and return it."""
+    _check_total(invoice)
+    with _lock:
+        data = load_invoices()
+        invoice["id"] = data["next_id"]
+        data["invoices"].append(invoice)
+        data["next_id"] += 1
+        _invoices_by_id[invoice["id"]] = invoice
+        _index_invoice(invoice)
+        _mark_invoices_dirty()
+        return invoice
+
+
+def set_invoice_status(invoice_id: int, status: str) -> Optional[dict]:
+    """Set an invoice's status. Returns the updated invoice, or None if not found."""
+    with _lock:
+        load_invoices()
+        invoice = _invoices_by_id.get(invoice_id)
+        if invoice is None:
+            return None
+        _remove_from_status_index(invoice)
+        invoice["status"] = status
+        _add_to_status_index(invoice)
+        _mark_invoices_dirty()
+        return invoice
+
+
+def snapshot() -> tuple[dict[int, dict], dict[int, dict]]:
+    """Get the clients and invoices ID indexes, loaded under a single lock."""
+    with _lock:
+        load_clients()
+        load_invoices()
+        return _clients_by_id, _invoices_by_id
 
 
 def get_client_by_id(client_id: int) -> Optional[dict]:
     """Get a client by ID."""
-    data = load_clients()
-    for client in data["clients"]:
-        if client["id"] == client_id:
-            return client
-    return None
+    with _lock:
+        load_clients()
+        return _clients_by_id.get(client_id)
 
 
 def get_invoice_by_id(invoice_id: int) -> Optional[dict]:
     """Get an invoice by ID."""
-    data = load_invoices()
-    for invoice in data["invoices"]:
-        if invoice["id"] == invoice_id:
-            return invoice
-    return None
+    with _lock:
+        load_invoices()
+        return _invoices_by_id.get(invoice_id)
+
+
+def get_client_search_index() -> list[ClientRow]:
+    """Get the client search index, in creation order."""
+    with _lock:
+        load_clients()
+        return list(_clients_search_index)
+
+
+def find_invoices(client_id: Optional[int] = None, status: Optional[str] = None) -> list[dict]:
+    """Get invoices matching the given client ID and/or status, in creation order."""
+    with _lock:
+        data = load_invoices()
+        if client_id is not None:
+            invoices = _invoices_by_client.get(client_id, [])
+            if status:
+                status = status.lower()
+                return [inv for inv in invoices if inv.get("status", "").lower() == status]
+            return list(invoices)
+        if status:
+            invoices = _invoices_by_status.get(status.lower(), {}).values()
+            return sorted(invoices, key=lambda inv: inv.get("id", 0))
+        return list(data["invoices"])
+
+
+def get_invoice_stats(recent: int = 5) -> dict:
+    """
+    Get dashboard figures for clients and invoices from one consistent state.
+
+    Counts come from the index sizes and paid revenue is the cached sum of the
+    "paid" status bucket, recomputed only after that bucket changes. Records are only ever appended, so the lists are in
+    created_at order and the most recent entries are at the end.
+    """
+    global _paid_revenue
+    with _lock:
+        clients = load_clients()["clients"]
+        invoices = load_invoices()["invoices"]
+        if _paid_revenue is None:
+            paid = _invoices_by_status.get("paid", {}).values()
+            _paid_revenue = math.fsum(inv.get("total", 0) for inv in paid)
+        return {
+            "total_clients": len(clients),
+            "total_invoices": len(invoices),
+            "total_revenue": _paid_revenue,
+            "counts": {status: len(bucket) for status, bucket in _invoices_by_status.items()},
+            "recent_clients": clients[-recent:][::-1],
+            "recent_invoices": invoices[-recent:][::-1]
+        }
@@ -2,16 +2,22 @@
 FastMCP server for client and invoice management.
 """
 
+import math
+import re
 from datetime import datetime
-from typing import Optional
+from typing import Callable, Optional
 from fastmcp import FastMCP
-from pydantic import ValidationError
 
 from src.database import (
-    load_clients, save_clients, load_invoices, save_invoices,
-    get_client_by_id, get_invoice_by_id
+    load_clients, insert_client, insert_invoice,
+    set_invoice_status, get_client_by_id, find_invoices, get_invoice_stats,
+    get_client_search_index, snapshot, ClientRow
 )
-from src.models import Client, InvoiceItem, Invoice, DashboardStats
+from src.models import Invoice, DashboardStats
+
+VALID_STATUSES = frozenset({"draft", "sent", "paid", "overdue"})
+
+_EMAIL_RE = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
 
 mcp = FastMCP(
     name="Client & Invoice Manager",
@@ -19,6 +25,93 @@ mcp = FastMCP(
 )
 
 
+def _to_float(value) -> Optional[float]:
+    """
+    Convert a number or numeric string to a finite float.
+    
+    Returns:
+        The float value, or None if the value is not a finite number
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        return None
+    try:
+        number = float(value)
+    except (ValueError, OverflowError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def _validate_item(item: dict) -> tuple[Optional[dict], list[str]]:
+    """
+    Validate an invoice item against the InvoiceItem constraints.
+    
+    Returns:
+        The normalized item and an empty list if the item is valid, otherwise
+        None and a list of "field: message" errors
+    """
+    errors = []
+    for field in ("description", "quantity", "unit_price"):
+        if field not in item:
+            errors.append(f"{field}: Field required")
+    if errors:
+        return None, errors
+    
+    description = item["description"]
+    if not isinstance(description, str):
+        errors.append("description: Input should be a valid string")
+    elif not description:
+        errors.append("description: String should have at least 1 character")
+    
+    quantity = _to_float(item["quantity"])
+    if quantity is None:
+        errors.append("quantity: Input should be a finite number")
+    elif quantity <= 0:
+        errors.append("quantity: Input should be greater than 0")
+    
+    unit_price = _to_float(item["unit_price"])
+    if unit_price is None:
+        errors.append("unit_price: Input should be a finite number")
+    elif unit_price < 0:
+        errors.append("unit_price: Input should be greater than or equal to 0")
+    
+    if not errors and not math.isfinite(quantity * unit_price):
+        errors.append("quantity * unit_price: Line total should be a finite number")
+    if errors:
+        return None, errors
+    return {"description": description, "quantity": quantity, "unit_price": unit_price}, errors
+
+
+def _make_client_filter(
+    query: Optional[str],
+    email: Optional[str],
+    company: Optional[str]
+) -> Optional[Callable[[ClientRow], bool]]:
+    """
+    Build a search predicate that only tests the filters actually given.
+    
+    Returns:
+        A function matching ClientRow entries, or None if no filter is active
+    """
+    q = query.lower() if query else ""
+    e = email.lower() if email else ""
+    c = company.lower() if company else ""
+    if q and e and c:
+        return lambda row: q in row.name_lc and e in row.email_lc and c in row.company_lc
+    if q and e:
+        return lambda row: q in row.name_lc and e in row.email_lc
+    if q and c:
+        return lambda row: q in row.name_lc and c in row.company_lc
+    if e and c:
+        return lambda row: e in row.email_lc and c in row.company_lc
+    if q:
+        return lambda row: q in row.name_lc
+    if e:
+        return lambda row: e in row.email_lc
+    if c:
+        return lambda row: c in row.company_lc
+    return None
+
+
 @mcp.tool()
 def add_client(
     name: str,
@@ -40,30 +133,26 @@ def add_client(
     Returns:
         The newly created client with ID
     """
-    try:
-        client = Client(
-            name=name,
-            email=email,
-            phone=phone,
-            address=address,
-            company=company
-        )
-    except ValidationError as e:
-        errors = []
-        for err in e.errors():
-            field = ".".join(str(loc) for loc in err["loc"])
-            errors.append(f"{field}: {err['msg']}")
+    errors = []
+    if not name:
+        errors.append("name: String should have at least 1 character")
+    if not _EMAIL_RE.fullmatch(email):
+        errors.append("email: value is not a valid email address")
+    if errors:
         return {"success": False, "error": f"Validation failed: {'; '.join(errors)}"}
     
-    data = load_clients()
-    client_dict = client.model_dump()
-    client_dict["id"] = data["next_id"]
-    client_dict["created_at"] = datetime.now().isoformat()
-    client_dict["updated_at"] = datetime.now().isoformat()
-    
-    data["clients"].append(client_dict)
-    data["next_id"] += 1
-    save_clients(data)
+    client_dict = {
+        "id": None,
+        "name": name,
+        "email": email,
+        "phone": phone,
+        "address": address,
+        "company": company
+    }
+    now = datetime.now().isoformat()
+    client_dict["created_at"] = now
+    client_dict["updated_at"] = now
+    insert_client(client_dict)
     
     return {"success": True, "client": client_dict}
 
@@ -85,29 +174,12 @@ def search_clients(
     Returns:
         List of matching clients
     """
-    data = load_clients()
-    clients = data["clients"]
-    results = []
-    
-    for client in clients:
-        match = True
-        
-        if query:
-            if query.lower() not in client.get("name", "").lower():
-                match = False
-        
-        if email:
-            if email.lower() not in client.get("email", "").lower():
-                match = False
-        
-        if company and client.get("company"):
-            if company.lower() not in client["company"].lower():
-                match = False
-        elif company and not client.get("company"):
-            match = False
-        
-        if match:
-            results.append(client)
+    rows = get_client_search_index()
+    predicate = _make_client_filter(query, email, company)
+    if predicate is None:
+        results = [row.record for row in rows]
+    else:
+        results = [row.record for row in rows if predicate(row)]
     
     return {"count": len(results), "clients": results}
 
@@ -130,15 +202,31 @@ def get_client(client_id: int) -> dict:
 
 
 @mcp.tool()
-def list_all_clients() -> dict:
+def list_all_clients(
+    limit: int = 100,
+    offset: int = 0,
+    fields: Optional[list[str]] = None
+) -> dict:
     """
-    List all clients in the database.
+    List clients in the database, one page at a time.
+    
+    Args:
+        limit: Maximum number of clients to return (default: 100)
+        offset: Number of clients to skip (default: 0)
+        fields: Only include these client fields, e.g. ["id", "name", "company"] (optional)
     
     Returns:
-        List of all clients with count
+        The requested page of clients with its count and the total number of clients
     """
-    data = load_clients()
-    return {"count": len(data["clients"]), "clients": data["clients"]}
+    if limit < 1 or offset < 0:
+        return {"success": False, "error": "limit must be at least 1 and offset must not be negative"}
+    
+    all_clients = load_clients()["clients"]
+    clients = all_clients[offset:offset + limit]
+    if fields:
+        clients = [{field: client.get(field) for field in fields} for client in clients]
+    
+    return {"count": len(clients), "total": len(all_clients), "clients": clients}
 
 
 @mcp.tool()
@@ -166,58 +254,40 @@ def create_invoice(
     if not client:
         return {"success": False, "error": f"Client with ID {client_id} not found"}
     
-    valid_statuses = ["draft", "sent", "paid", "overdue"]
-    if status.lower() not in valid_statuses:
-        return {"success": False, "error": f"Invalid status. Must be one of: {valid_statuses}"}
+    status_lc = status.lower()
+    if status_lc not in VALID_STATUSES:
+        return {"success": False, "error": f"Invalid status. Must be one of: {', '.join(sorted(VALID_STATUSES))}"}
     
     if not items:
         return {"success": False, "error": "At least one invoice item is required"}
     
-    invoice_items = []
+    total = 0.0
+    item_dicts = []
     for i, item in enumerate(items):
-        required_fields = ["description", "quantity", "unit_price"]
-        missing_fields = [f for f in required_fields if f not in item]
-        if missing_fields:
-            return {
-                "success": False,
-                "error": f"Item {i + 1} is missing required fields: {', '.join(missing_fields)}"
-            }
-        
-        try:
-            invoice_item = InvoiceItem(
-                description=item["description"],
-                quantity=item["quantity"],
-                unit_price=item["unit_price"]
-            )
-            invoice_items.append(invoice_item)
-        except ValidationError as e:
-            errors = []
-            for err in e.errors():
-                field = ".".join(str(loc) for loc in err["loc"])
-                errors.append(f"{field}: {err['msg']}")
+        item_dict, errors = _validate_item(item)
+        if errors:
             return {
                 "success": False,
                 "error": f"Item {i + 1} validation failed: {'; '.join(errors)}"
             }
+        total += item_dict["quantity"] * item_dict["unit_price"]
+        item_dicts.append(item_dict)
     
-    total = sum(item.quantity * item.unit_price for item in invoice_items)
+    if not math.isfinite(total):
+        return {"success": False, "error": "Invoice total should be a finite number"}
     
-    data = load_invoices()
     invoice_dict = {
-        "id": data["next_id"],
+        "id": None,
         "client_id": client_id,
         "client_name": client["name"],
-        "items": [item.model_dump() for item in invoice_items],
-        "status": status.lower(),
+        "items": item_dicts,
+        "status": status_lc,
         "notes": notes,
         "created_at": datetime.now().isoformat(),
         "due_date": due_date,
         "total": total
     }
-    
-    data["invoices"].append(invoice_dict)
-    data["next_id"] += 1
-    save_invoices(data)
+    insert_invoice(invoice_dict)
     
     return {"success": True, "invoice": invoice_dict}
 
@@ -233,9 +303,10 @@ def get_invoice(invoice_id: int) -> dict:
     Returns:
         The invoice details or an error message
     """
-    invoice = get_invoice_by_id(invoice_id)
+    clients_by_id, invoices_by_id = snapshot()
+    invoice = invoices_by_id.get(invoice_id)
     if invoice:
-        client = get_client_by_id(invoice["client_id"])
+        client = clients_by_id.get(invoice["client_id"])
         return {
             "success": True,
             "invoice": invoice,
@@ -259,23 +330,7 @@ def list_invoices(
     Returns:
         List of matching invoices
     """
-    data = load_invoices()
-    invoices = data["invoices"]
-    results = []
-    
-    for invoice in invoices:
-        match = True
-        
-        if client_id is not None:
-            if invoice.get("client_id") != client_id:
-                match = False
-        
-        if status:
-            if invoice.get("status", "").lower() != status.lower():
-                match = False
-        
-        if match:
-            results.append(invoice)
+    results = find_invoices(client_id=client_id, status=status)
     
     total_amount = sum(inv.get("total", 0) for inv in results)
     
@@ -298,17 +353,13 @@ def update_invoice_status(invoice_id: int, status: str) -> dict:
     Returns:
         The updated invoice or an error message
     """
-    valid_statuses = ["draft", "sent", "paid", "overdue"]
-    if status.lower() not in valid_statuses:
-        return {"success": False, "error": f"Invalid status. Must be one of: {valid_statuses}"}
-    
-    data = load_invoices()
-    for invoice in data["invoices"]:
-        if invoice["id"] == invoice_id:
-            invoice["status"] = status.lower()
-            save_invoices(data)
-            return {"success": True, "invoice": invoice}
+    status_lc = status.lower()
+    if status_lc not in VALID_STATUSES:
+        return {"success": False, "error": f"Invalid status. Must be one of: {', '.join(sorted(VALID_STATUSES))}"}
     
+    invoice = set_invoice_status(invoice_id, status_lc)
+    if invoice:
+        return {"success": True, "invoice": invoice}
     return {"success": False, "error": f"Invoice with ID {invoice_id} not found"}
 
 
@@ -320,32 +371,22 @@ def dashboard() -> dict:
     Returns:
         Statistics including total clients, invoices, revenue, and invoice breakdowns
     """
-    clients_data = load_clients()
-    invoices_data = load_invoices()
-    
-    invoices = invoices_data["invoices"]
-    
-    total_revenue = sum(inv.get("total", 0) for inv in invoices if inv.get("status") == "paid")
-    pending_invoices = len([inv for inv in invoices if inv.get("status") in ["sent", "overdue"]])
-    paid_invoices = len([inv for inv in invoices if inv.get("status") == "paid"])
-    draft_invoices = len([inv for inv in invoices if inv.get("status") == "draft"])
+    invoice_stats = get_invoice_stats()
+    counts = invoice_stats["counts"]
     
     stats = DashboardStats(
-        total_clients=len(clients_data["clients"]),
-        total_invoices=len(invoices),
-        total_revenue=total_revenue,
-        pending_invoices=pending_invoices,
-        paid_invoices=paid_invoices,
-        draft_invoices=draft_invoices
+        total_clients=invoice_stats["total_clients"],
+        total_invoices=invoice_stats["total_invoices"],
+        total_revenue=invoice_stats["total_revenue"],
+        pending_invoices=counts.get("sent", 0) + counts.get("overdue", 0),
+        paid_invoices=counts.get("paid", 0),
+        draft_invoices=counts.get("draft", 0)
     )
     
-    recent_invoices = sorted(invoices, key=lambda x: x.get("created_at", ""), reverse=True)[:5]
-    recent_clients = sorted(clients_data["clients"], key=lambda x: x.get("created_at", ""), reverse=True)[:5]
-    
     return {
         "statistics": stats.model_dump(),
-        "recent_invoices": recent_invoices,
-        "recent_clients": recent_clients
+        "recent_invoices": invoice_stats["recent_invoices"],
+        "recent_clients": invoice_stats["recent_clients"]
     }
 
 
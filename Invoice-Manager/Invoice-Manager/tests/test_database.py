@@ -0,0 +1,197 @@
+"""
+Tests for the cached JSON database.
+"""
+
+import math
+import threading
+import time
+
+import orjson
+import pytest
+
+
+def test_flush_writes_pending_changes(db):
+    db.insert_client({"id": None, "name": "Ada"})
+    db.sync_now()
+
+    data = orjson.loads(db.CLIENTS_FILE.read_bytes())
+    assert data == {"clients": [{"id": 1, "name": "Ada"}], "next_id": 2}
+    assert not db._clients_dirty
+
+
+def test_burst_of_mutations_is_flushed_once(db, monkeypatch):
+    write_bytes = db._write_bytes
+    calls = []
+
+    def counting_write(path, payload):
+        calls.append(path)
+        write_bytes(path, payload)
+
+    monkeypatch.setattr(db, "_write_bytes", counting_write)
+    monkeypatch.setattr(db, "FLUSH_DELAY", 0.05)
+    for name in ("Ada", "Grace", "Edsger", "Barbara"):
+        db.insert_client({"id": None, "name": name})
+    assert calls == []
+
+    deadline = time.monotonic() + 2
+    while db._clients_dirty and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert calls == [db.CLIENTS_FILE]
+    assert len(orjson.loads(db.CLIENTS_FILE.read_bytes())["clients"]) == 4
+
+
+def test_failed_flush_is_retried(db, monkeypatch):
+    write_bytes = db._write_bytes
+    calls = []
+
+    def flaky_write(path, payload):
+        calls.append(path)
+        if len(calls) == 1:
+            raise OSError("disk full")
+        write_bytes(path, payload)
+
+    monkeypatch.setattr(db, "_write_bytes", flaky_write)
+    monkeypatch.setattr(db, "FLUSH_DELAY", 0.01)
+    db.insert_client({"id": None, "name": "Ada"})
+    db.sync_now()
+    assert db._clients_dirty
+
+    deadline = time.monotonic() + 2
+    while db._clients_dirty and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not db._clients_dirty
+    assert len(calls) == 2
+    assert orjson.loads(db.CLIENTS_FILE.read_bytes())["clients"][0]["name"] == "Ada"
+
+
+def test_reads_are_not_blocked_by_a_flush(db, monkeypatch):
+    writing = threading.Event()
+    release = threading.Event()
+    write_bytes = db._write_bytes
+
+    def slow_write(path, payload):
+        writing.set()
+        release.wait(2)
+        write_bytes(path, payload)
+
+    monkeypatch.setattr(db, "_write_bytes", slow_write)
+    db.insert_client({"id": None, "name": "Ada"})
+    flush = threading.Thread(target=db.sync_now)
+    flush.start()
+    try:
+        assert writing.wait(2)
+        # The lock is free while the file is being written, and the cache
+        # stays authoritative because the flush has not finished yet.
+        assert db._lock.acquire(timeout=0.5)
+        db._lock.release()
+        assert db.get_client_by_id(1)["name"] == "Ada"
+        db.insert_client({"id": None, "name": "Grace"})
+    finally:
+        release.set()
+        flush.join()
+
+    assert db._clients_dirty
+    db.sync_now()
+    names = [c["name"] for c in orjson.loads(db.CLIENTS_FILE.read_bytes())["clients"]]
+    assert names == ["Ada", "Grace"]
+
+
+def test_paid_revenue_does_not_drift(db):
+    db.insert_invoice({"id": None, "client_id": 1, "status": "paid", "total": 0.10})
+    db.insert_invoice({"id": None, "client_id": 1, "status": "paid", "total": 0.20})
+
+    for _ in range(3):
+        db.set_invoice_status(1, "draft")
+        db.set_invoice_status(2, "draft")
+        assert db.get_invoice_stats()["total_revenue"] == 0.0
+        db.set_invoice_status(1, "paid")
+        db.set_invoice_status(2, "paid")
+        assert db.get_invoice_stats()["total_revenue"] == math.fsum([0.10, 0.20])
+
+    db.set_invoice_status(1, "draft")
+    db.set_invoice_status(2, "draft")
+    db.sync_now()
+    db._invoices_cache = None
+    stats = db.get_invoice_stats()
+    assert stats["total_revenue"] == 0.0
+    assert stats["counts"].get("paid", 0) == 0
+    assert stats["counts"]["draft"] == 2
+
+
+def test_paid_revenue_is_cached_until_paid_bucket_changes(db, monkeypatch):
+    db.insert_invoice({"id": None, "client_id": 1, "status": "paid", "total": 10.0})
+    db.insert_invoice({"id": None, "client_id": 1, "status": "draft", "total": 5.0})
+    assert db.get_invoice_stats()["total_revenue"] == 10.0
+
+    sums = []
+    fsum = math.fsum
+    monkeypatch.setattr(db.math, "fsum", lambda values: sums.append(1) or fsum(values))
+    db.get_invoice_stats()
+    db.set_invoice_status(2, "sent")
+    db.get_invoice_stats()
+    assert sums == []
+
+    db.set_invoice_status(2, "paid")
+    assert db.get_invoice_stats()["total_revenue"] == 15.0
+    assert db.get_invoice_stats()["total_revenue"] == 15.0
+    assert sums == [1]
+
+
+def test_invoice_stats_recent_entries(db):
+    for name in "abcdefg":
+        db.insert_client({"id": None, "name": name})
+    db.insert_invoice({"id": None, "client_id": 1, "status": "sent", "total": 5.0})
+
+    stats = db.get_invoice_stats()
+    assert stats["total_clients"] == 7
+    assert stats["total_invoices"] == 1
+    assert [c["name"] for c in stats["recent_clients"]] == ["g", "f", "e", "d", "c"]
+    assert [inv["id"] for inv in stats["recent_invoices"]] == [1]
+
+
+def test_non_finite_totals_are_rejected(db):
+    for total in (float("inf"), float("nan"), None):
+        with pytest.raises(ValueError):
+            db.insert_invoice({"id": None, "client_id": 1, "status": "paid", "total": total})
+    assert db.load_invoices()["invoices"] == []
+
+
+def test_null_totals_are_recalculated_on_load(db):
+    db.ensure_data_dir()
+    db.INVOICES_FILE.write_bytes(orjson.dumps({
+        "invoices": [{
+            "id": 1,
+            "client_id": 1,
+            "status": "paid",
+            "items": [{"description": "Work", "quantity": 2, "unit_price": 3.5}],
+            "total": None
+        }],
+        "next_id": 2
+    }))
+
+    assert db.get_invoice_by_id(1)["total"] == 7.0
+    assert db.get_invoice_stats()["total_revenue"] == 7.0
+
+
+def test_find_invoices_uses_consistent_indexes(db):
+    for client_id, status in [(1, "draft"), (2, "paid"), (1, "sent"), (1, "draft"), (2, "draft")]:
+        db.insert_invoice({"id": None, "client_id": client_id, "status": status, "total": 1.0})
+    db.set_invoice_status(4, "paid")
+    db.set_invoice_status(2, "draft")
+
+    def ids(invoices):
+        return [inv["id"] for inv in invoices]
+
+    assert ids(db.find_invoices()) == [1, 2, 3, 4, 5]
+    assert ids(db.find_invoices(client_id=1)) == [1, 3, 4]
+    assert ids(db.find_invoices(client_id=3)) == []
+    assert ids(db.find_invoices(status="DRAFT")) == [1, 2, 5]
+    assert ids(db.find_invoices(status="Paid")) == [4]
+    assert ids(db.find_invoices(client_id=1, status="draft")) == [1]
+    assert ids(db.find_invoices(client_id=2, status="draft")) == [2, 5]
+    assert ids(db.find_invoices(client_id=1, status="overdue")) == []
+
+    db.sync_now()
+    db._invoices_cache = None
+    assert ids(db.find_invoices(status="draft")) == [1, 2, 5]
+    assert ids(db.find_invoices(client_id=1, status="paid")) == [4]
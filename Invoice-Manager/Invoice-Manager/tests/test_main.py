@@ -0,0 +1,36 @@
+"""
+Tests for the server entry point.
+"""
+
+import os
+import signal
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+import orjson
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+
+def test_sigterm_flushes_pending_writes(tmp_path):
+    script = textwrap.dedent("""
+        import os
+        import signal
+        import time
+
+        import main
+        from src import database
+
+        signal.signal(signal.SIGTERM, main.handle_sigterm)
+        database.insert_client({"id": None, "name": "Ada"})
+        os.kill(os.getpid(), signal.SIGTERM)
+        time.sleep(5)
+    """)
+    env = dict(os.environ, PYTHONPATH=str(PROJECT_DIR))
+    result = subprocess.run([sys.executable, "-c", script], cwd=tmp_path, env=env, timeout=30)
+
+    assert result.returncode == -signal.SIGTERM
+    data = orjson.loads((tmp_path / "data" / "clients.json").read_bytes())
+    assert [c["name"] for c in data["clients"]] == ["Ada"]
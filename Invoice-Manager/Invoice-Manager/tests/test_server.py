@@ -0,0 +1,101 @@
+"""
+Tests for the MCP tool functions.
+"""
+
+import itertools
+
+from src import server
+
+
+def _create_invoice(**kwargs):
+    return server.create_invoice.fn(**kwargs)
+
+
+def _add_client():
+    return server.add_client.fn(name="Ada Lovelace", email="ada@example.com")["client"]
+
+
+def test_create_invoice_accepts_numeric_strings(db):
+    client = _add_client()
+    result = _create_invoice(
+        client_id=client["id"],
+        items=[{"description": "Consulting", "quantity": "2", "unit_price": "12.5"}]
+    )
+
+    assert result["success"]
+    assert result["invoice"]["items"][0]["quantity"] == 2.0
+    assert result["invoice"]["total"] == 25.0
+
+
+def test_create_invoice_rejects_non_finite_amounts(db):
+    client = _add_client()
+    for item in (
+        {"description": "Huge", "quantity": 10**400, "unit_price": 1},
+        {"description": "Inf", "quantity": 1, "unit_price": "inf"},
+        {"description": "Overflow", "quantity": 1e200, "unit_price": 1e200},
+    ):
+        result = _create_invoice(client_id=client["id"], items=[item])
+        assert not result["success"]
+        assert result["error"].startswith("Item 1 validation failed")
+
+    result = _create_invoice(
+        client_id=client["id"],
+        items=[
+            {"description": "Big", "quantity": 1e300, "unit_price": 1e8},
+            {"description": "Big", "quantity": 1e300, "unit_price": 1e8},
+        ]
+    )
+    assert not result["success"]
+    assert "finite" in result["error"]
+    assert db.get_invoice_stats()["total_invoices"] == 0
+
+
+def test_list_all_clients_pagination_and_fields(db):
+    for i in range(5):
+        server.add_client.fn(name=f"Client {i}", email=f"c{i}@example.com", company=f"Co {i}")
+
+    page = server.list_all_clients.fn(limit=2, offset=1)
+    assert page["count"] == 2
+    assert page["total"] == 5
+    assert [c["name"] for c in page["clients"]] == ["Client 1", "Client 2"]
+
+    assert server.list_all_clients.fn(offset=4)["count"] == 1
+    assert server.list_all_clients.fn(offset=10)["clients"] == []
+    assert server.list_all_clients.fn()["count"] == 5
+
+    projected = server.list_all_clients.fn(limit=1, fields=["id", "company", "missing"])
+    assert projected["clients"] == [{"id": 1, "company": "Co 0", "missing": None}]
+
+
+def test_list_all_clients_rejects_bad_paging(db):
+    for kwargs in ({"limit": 0}, {"limit": -1}, {"offset": -1}):
+        result = server.list_all_clients.fn(**kwargs)
+        assert result["success"] is False
+        assert "limit" in result["error"]
+
+
+def _matches_all_filters(client, query, email, company):
+    if query and query.lower() not in client["name"].lower():
+        return False
+    if email and email.lower() not in client["email"].lower():
+        return False
+    if company and (not client["company"] or company.lower() not in client["company"].lower()):
+        return False
+    return True
+
+
+def test_search_clients_every_filter_combination(db):
+    server.add_client.fn(name="Ada Lovelace", email="ada@engine.org", company="Analytical Engines")
+    server.add_client.fn(name="Grace Hopper", email="grace@navy.mil", company="US Navy")
+    server.add_client.fn(name="Alan Turing", email="alan@bletchley.uk")
+    server.add_client.fn(name="Adele Goldberg", email="adele@parc.com", company="Xerox PARC")
+    clients = server.list_all_clients.fn()["clients"]
+
+    queries = (None, "", "a", "ADA", "zzz")
+    emails = (None, "", "@", "NAVY", "zzz")
+    companies = (None, "", "e", "navy", "zzz")
+    for query, email, company in itertools.product(queries, emails, companies):
+        result = server.search_clients.fn(query=query, email=email, company=company)
+        expected = [c for c in clients if _matches_all_filters(c, query, email, company)]
+        assert result["clients"] == expected, (query, email, company)
+        assert result["count"] == len(expected)